@@ -0,0 +1,24 @@
+"""
+Gunicorn configuration.
+
+Worker count, class and threads come from the environment so the thread
+budget computed here matches the one each worker applies in ``wsgi.py``.
+"""
+import os
+
+from predict_disorder import thread_budget
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '1'))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'sync')
+threads = int(os.getenv('GUNICORN_THREADS', '1'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+
+# exported here so forked workers inherit it before importing TensorFlow
+budget = thread_budget.apply(thread_budget.compute_budget(workers, worker_class, threads))
+
+
+def when_ready(server):
+    server.log.info(
+        "Thread budget: %(cpus)s CPUs, %(workers)s x %(worker_class)s workers, "
+        "intra_op=%(intra_op)s inter_op=%(inter_op)s blas=%(blas)s", budget)
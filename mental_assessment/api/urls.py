@@ -1,7 +1,12 @@
 from django.urls import path
-from .views import GeneralTestApiView, TestResultsApiView
+from .views import (
+    ExportResultsApiView, GeneralTestApiView, ModelBundleApiView, ShadowStatsApiView, TestResultsApiView,
+)
 
 urlpatterns = [
     path("predict/", GeneralTestApiView.as_view(), name="api_predict"),
     path("results/", TestResultsApiView.as_view(), name="api_results"),
+    path("results/export/<str:export_format>/", ExportResultsApiView.as_view(), name="api_results_export"),
+    path("model/bundle/", ModelBundleApiView.as_view(), name="api_model_bundle"),
+    path("shadow/", ShadowStatsApiView.as_view(), name="api_shadow_stats"),
 ]
@@ -1,13 +1,53 @@
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
+from rest_framework.negotiation import BaseContentNegotiation
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from ..models import GeneralTestResult
 from .serializers import GeneralTestResultSerializer
-from ..utils import FEATURES_NAME, predict_disorder
+from .. import bundle, shadow
+from ..export import EXPORT_FORMATS, accepts_gzip, export_stream
+from ..idempotency import idempotent
+from ..utils import (
+    CATALOG_JSON, CATALOG_VERSION, DISORDER_IDS, FEATURES_NAME, compact_prediction, predict_disorder, wants_compact,
+)
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    """For views that build their own non-JSON response, whatever the client accepts."""
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return (renderers[0], renderers[0].media_type)
+
+
+def versioned_response(request, content, version, content_type, max_age=3600):
+    """Response with a strong ETag; a 304 when the client already holds this version.
+
+    Clients that ask for the version they hold (?version=...) may cache it forever.
+    """
+    etag = f'"{version}"'
+    if request.GET.get('version') == version:
+        cache = {"public": True, "max_age": 365 * 24 * 3600, "immutable": True}
+    else:
+        cache = {"public": True, "max_age": max_age}
+    if etag in [tag.strip() for tag in request.META.get('HTTP_IF_NONE_MATCH', '').split(',')]:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content, content_type=content_type)
+    response['ETag'] = etag
+    patch_cache_control(response, **cache)
+    return response
+
 
 class GeneralTestApiView(APIView):
     permission_classes = [AllowAny]
 
+    @method_decorator(idempotent)
     def post(self, request):
         answers = request.data.get("answers", [])
         if len(answers) != 28:
@@ -41,6 +81,8 @@ class GeneralTestApiView(APIView):
                 answers=answers_numeric
             )
 
+        if wants_compact(request):
+            return Response(compact_prediction(result["predicted_disorder"]))
         return Response(result)
 
 class TestResultsApiView(APIView):
@@ -48,5 +90,68 @@ class TestResultsApiView(APIView):
 
     def get(self, request):
         results = GeneralTestResult.objects.filter(user=request.user).order_by('-created_at')
+        if wants_compact(request):
+            rows = results.values_list('id', 'predicted_disorder', 'answers', 'created_at')
+            return Response({
+                "catalog_version": CATALOG_VERSION,
+                "results": [
+                    {
+                        "id": pk,
+                        "disorder_id": DISORDER_IDS.get(predicted_disorder),
+                        "predicted_disorder": predicted_disorder,
+                        "answers": answers,
+                        "created_at": created_at,
+                    }
+                    for pk, predicted_disorder, answers, created_at in rows
+                ],
+            })
         serializer = GeneralTestResultSerializer(results, many=True)
         return Response(serializer.data)
+
+class ExportResultsApiView(APIView):
+    permission_classes = [IsAuthenticated]
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    def get(self, request, export_format):
+        if export_format not in EXPORT_FORMATS:
+            return Response({"error": "Export format must be csv or ndjson."}, status=400)
+
+        compress = accepts_gzip(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        results = GeneralTestResult.objects.filter(user=request.user).order_by('-created_at')
+        response = StreamingHttpResponse(
+            export_stream(results, export_format, compress),
+            content_type=EXPORT_FORMATS[export_format],
+        )
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        response['Vary'] = 'Accept-Encoding'
+        response['Content-Disposition'] = f'attachment; filename="assessment-history.{export_format}"'
+        return response
+
+
+class ModelBundleApiView(APIView):
+    permission_classes = [AllowAny]
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    def get(self, request):
+        served = bundle.get_bundle()
+        if served is None:
+            return Response({"error": "Model or encoder not loaded"}, status=503)
+        data, version = served
+        response = versioned_response(request, data, version, 'application/octet-stream')
+        response['X-Model-Version'] = version
+        return response
+
+
+class ShadowStatsApiView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(shadow.shadow_stats())
+
+
+class DisorderCatalogApiView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        return versioned_response(request, CATALOG_JSON, CATALOG_VERSION, 'application/json', max_age=24 * 3600)
@@ -0,0 +1,122 @@
+"""
+Interchangeable ways of running the general model.
+
+Each backend factory takes the loaded Keras model and returns a function that
+maps a float32 matrix of answers (rows x 28) to the model's raw output
+scores (``compiled_indices``, the one serving requests, returns the class
+indices instead). They must agree with ``keras_predict`` on every label; the
+``benchmark_inference`` command checks that and times them.
+"""
+import json
+
+import numpy as np
+
+
+def keras_predict(model):
+    return lambda features: model.predict(features, verbose=0)
+
+
+def keras_call(model):
+    return lambda features: model(features, training=False).numpy()
+
+
+def _traced(model, outputs):
+    import tensorflow as tf
+    signature = [tf.TensorSpec((None, model.input_shape[-1]), tf.float32)]
+    traced = tf.function(outputs, input_signature=signature)
+    # float32 input passes through np.asarray without a copy
+    return lambda features: traced(np.asarray(features, dtype=np.float32)).numpy()
+
+
+def compiled(model):
+    """Traced once with a fixed (None, 28) float32 signature, skipping predict()'s per-call setup."""
+    return _traced(model, lambda features: model(features, training=False))
+
+
+def compiled_indices(model):
+    """Like compiled(), with the argmax done in the graph so only class indices come back."""
+    import tensorflow as tf
+    return _traced(model, lambda features: tf.argmax(model(features, training=False), axis=1, output_type=tf.int32))
+
+
+def dense_layers(model):
+    """(kernel, bias, activation) for each Dense layer; Dropout is a no-op at inference."""
+    layers = []
+    for layer in model.layers:
+        kind = type(layer).__name__
+        if kind == 'Dropout':
+            continue
+        if kind != 'Dense':
+            raise ValueError(f"Unsupported layer {layer.name} ({kind})")
+        kernel, bias = layer.get_weights()
+        layers.append((
+            np.asarray(kernel, dtype=np.float32),
+            np.asarray(bias, dtype=np.float32),
+            layer.get_config()['activation'],
+        ))
+    return layers
+
+
+def h5_dense_layers(path):
+    """dense_layers() read straight from a Keras .h5 file, without importing TensorFlow."""
+    import h5py
+    layers = []
+    with h5py.File(path, 'r') as f:
+        config = json.loads(f.attrs['model_config'])
+        for layer in config['config']['layers']:
+            kind, name = layer['class_name'], layer['config']['name']
+            if kind in ('InputLayer', 'Dropout'):
+                continue
+            if kind != 'Dense':
+                raise ValueError(f"Unsupported layer {name} ({kind})")
+            group = f['model_weights'][name]
+            weights = {}
+            for weight_name in group.attrs['weight_names']:
+                if isinstance(weight_name, bytes):
+                    weight_name = weight_name.decode('utf-8')
+                weights[weight_name.rsplit('/', 1)[-1]] = np.asarray(group[weight_name], dtype=np.float32)
+            layers.append((weights['kernel'], weights['bias'], layer['config']['activation']))
+    return layers
+
+
+def softmax(scores):
+    shifted = np.exp(scores - scores.max(axis=-1, keepdims=True))
+    return shifted / shifted.sum(axis=-1, keepdims=True)
+
+
+ACTIVATIONS = {
+    'linear': lambda z: z,
+    'relu': lambda z: np.maximum(z, 0, out=z),
+    'sigmoid': lambda z: 1 / (1 + np.exp(-z)),
+    'tanh': np.tanh,
+    'softmax': softmax,
+}
+
+
+def forward(layers, features):
+    out = np.asarray(features, dtype=np.float32)
+    for kernel, bias, activation in layers:
+        out = ACTIVATIONS[activation](out @ kernel + bias)
+    return out
+
+
+def numpy_forward(model):
+    layers = dense_layers(model)
+    return lambda features: forward(layers, features)
+
+
+def bundle_forward(model):
+    # round-trips the weights through the on-device bundle and its reference decoder
+    from . import bundle
+    _, layers = bundle.decode_bundle(bundle.build_bundle(dense_layers(model), labels=[]))
+    return lambda features: forward(layers, features)
+
+
+BACKENDS = {
+    'keras_predict': keras_predict,
+    'keras_call': keras_call,
+    'compiled': compiled,
+    'compiled_indices': compiled_indices,
+    'numpy': numpy_forward,
+    'bundle': bundle_forward,
+}
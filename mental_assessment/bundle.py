@@ -0,0 +1,102 @@
+"""
+Compact export of the general model for on-device scoring.
+
+Layout (little endian)::
+
+    b'PDMB' | u16 format | u16 0 | u32 manifest length | manifest JSON (utf-8)
+    | zero padding to a 4 byte boundary | float32 weights
+
+The weights are those the server predicts with: the float32 .h5 weights, or
+the dequantized GENERAL_MODEL_WEIGHTS artifact when that is set and loads (named in
+the manifest's ``precision``), so the version changes with the artifact.
+
+The manifest lists FEATURES_NAME (input order), the label table, and for each
+Dense layer its activation and where its kernel (inputs x units, row major)
+and bias sit in the weights, as float32 offsets/lengths. The output is the
+model's raw scores; the argmax indexes the label table. ``decode_bundle`` and
+``predict`` are the reference decoder and forward pass for client ports.
+"""
+import hashlib
+import json
+import struct
+
+import numpy as np
+
+from . import backends, utils
+
+MAGIC = b'PDMB'
+FORMAT = 1
+PREAMBLE = struct.Struct('<4sHHI')
+FLOAT = np.dtype('<f4')
+
+
+def build_bundle(layers, labels, precision='float32'):
+    blobs = []
+    specs = []
+    offset = 0
+    for kernel, bias, activation in layers:
+        spec = {"inputs": kernel.shape[0], "units": kernel.shape[1], "activation": activation}
+        for name, array in (("kernel", kernel), ("bias", bias)):
+            blobs.append(np.ascontiguousarray(array, dtype=FLOAT).tobytes())
+            spec[name] = {"offset": offset, "length": int(array.size)}
+            offset += int(array.size)
+        specs.append(spec)
+    weights = b''.join(blobs)
+
+    manifest = {
+        "format": FORMAT,
+        "features": list(utils.FEATURES_NAME),
+        "labels": [str(label) for label in labels],
+        "input_dtype": "float32",
+        "precision": precision,
+        "output": "scores",
+        "layers": specs,
+    }
+    manifest["version"] = hashlib.sha256(
+        json.dumps(manifest, sort_keys=True).encode('utf-8') + weights
+    ).hexdigest()[:16]
+
+    encoded = json.dumps(manifest, separators=(',', ':')).encode('utf-8')
+    padding = b'\0' * (-(PREAMBLE.size + len(encoded)) % FLOAT.itemsize)
+    return PREAMBLE.pack(MAGIC, FORMAT, 0, len(encoded)) + encoded + padding + weights
+
+
+def decode_bundle(data):
+    """(manifest, layers) where layers are (kernel, bias, activation) as for backends.forward."""
+    magic, version, _, length = PREAMBLE.unpack_from(data)
+    if magic != MAGIC or version != FORMAT:
+        raise ValueError("Not a model bundle this decoder understands")
+    manifest = json.loads(data[PREAMBLE.size:PREAMBLE.size + length])
+    start = PREAMBLE.size + length
+    start += -start % FLOAT.itemsize
+    weights = np.frombuffer(data, dtype=FLOAT, offset=start)
+
+    layers = []
+    for spec in manifest["layers"]:
+        kernel = weights[spec["kernel"]["offset"]:][:spec["kernel"]["length"]]
+        bias = weights[spec["bias"]["offset"]:][:spec["bias"]["length"]]
+        layers.append((kernel.reshape(spec["inputs"], spec["units"]), bias, spec["activation"]))
+    return manifest, layers
+
+
+def predict(data, rows):
+    """Labels for rows of answers (in manifest feature order), decoded from the bundle alone."""
+    manifest, layers = decode_bundle(data)
+    scores = backends.forward(layers, rows)
+    return [manifest["labels"][i] for i in np.argmax(scores, axis=1)]
+
+
+_bundle = None
+
+
+def get_bundle():
+    """(bundle bytes, version) for the served model, built once per process, or None."""
+    global _bundle
+    if _bundle is None:
+        layers = utils.served_general_layers()
+        if layers is None or utils.label_encoder is None:
+            return None
+        precision = utils.quantized_model.dtype if utils.use_quantized_model() else 'float32'
+        data = build_bundle(layers, utils.label_encoder.classes_, precision)
+        _bundle = (data, decode_bundle(data)[0]["version"])
+    return _bundle
@@ -0,0 +1,111 @@
+"""
+Streaming export of a user's assessment history.
+
+The rows come from a server-side iterator over a few columns, are expanded to
+one named column per FEATURES_NAME answer as they are written, and are
+optionally gzip-compressed on the fly, so memory use does not grow with the
+size of the history.
+"""
+import csv
+import io
+import json
+import zlib
+
+from .utils import FEATURES_NAME
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+EXPORT_COLUMNS = ('id', 'created_at', 'predicted_disorder', 'answers')
+CHUNK_SIZE = 500
+FLUSH_BYTES = 16 * 1024
+
+
+def _answers(answers):
+    if isinstance(answers, list) and len(answers) == len(FEATURES_NAME):
+        return answers
+    return [None] * len(FEATURES_NAME)
+
+
+def accepts_gzip(accept_encoding):
+    """Whether an Accept-Encoding header allows gzip, honouring q-values (``gzip;q=0`` refuses it)."""
+    qualities = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+    for coding in ('gzip', 'x-gzip', '*'):
+        if coding in qualities:
+            return qualities[coding] > 0
+    return False
+
+
+def csv_lines(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['id', 'created_at', 'predicted_disorder', *FEATURES_NAME])
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    for pk, created_at, predicted_disorder, answers in rows:
+        writer.writerow([pk, created_at.isoformat(), predicted_disorder, *_answers(answers)])
+        if buffer.tell() >= FLUSH_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def ndjson_lines(rows):
+    buffer = []
+    size = 0
+    first = True
+    for pk, created_at, predicted_disorder, answers in rows:
+        line = json.dumps({
+            "id": pk,
+            "created_at": created_at.isoformat(),
+            "predicted_disorder": predicted_disorder,
+            "answers": dict(zip(FEATURES_NAME, _answers(answers))),
+        }) + '\n'
+        buffer.append(line)
+        size += len(line)
+        if first or size >= FLUSH_BYTES:
+            # the first row goes out on its own so the download starts right away
+            first = False
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    yield ''.join(buffer)
+
+
+def gzip_stream(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    first = True
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if first:
+            # push the gzip header and the first rows out right away
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+            first = False
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(queryset, export_format, compress):
+    rows = queryset.values_list(*EXPORT_COLUMNS).iterator(chunk_size=CHUNK_SIZE)
+    lines = csv_lines(rows) if export_format == 'csv' else ndjson_lines(rows)
+    if compress:
+        return gzip_stream(lines)
+    return (chunk.encode('utf-8') for chunk in lines)
@@ -0,0 +1,123 @@
+"""
+Idempotency keys for prediction submissions.
+
+Mobile clients retry submissions on flaky networks. When a request carries
+an ``Idempotency-Key`` header, the first response for that key (per user and
+URL) is stored in the ``idempotency`` cache, and replays get it back without
+running validation, inference or the database insert again. A duplicate that
+arrives while the first request is still running waits for it, for up to
+``IDEMPOTENCY_WAIT`` seconds.
+
+The default cache is a file cache on local disk, so every worker on the
+machine sees the same entries; it is bounded by ``MAX_ENTRIES`` and entries
+expire after ``TIMEOUT``. In-flight claims live in the separate
+``idempotency_claims`` cache, so culling stored responses can't release a
+claim early. Point both caches at Redis or Memcached to share keys between
+machines.
+"""
+import hashlib
+import os
+import tempfile
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+from django.http import HttpResponse, JsonResponse
+from rest_framework.response import Response
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+MAX_KEY_LENGTH = 255
+# a claim outlives a stuck request by this much at most
+CLAIM_TIMEOUT = 60
+POLL_INTERVAL = 0.05
+
+
+class AtomicFileBasedCache(FileBasedCache):
+    """FileBasedCache whose add() is atomic across processes, so it can hold claims.
+
+    add() never culls: a claim is deleted when its request finishes and
+    expires after CLAIM_TIMEOUT, and culling could drop a live one.
+    """
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if self.has_key(key, version):  # also removes an expired entry
+            return False
+        self._createdir()
+        fname = self._key_to_file(key, version)
+        fd, tmp_path = tempfile.mkstemp(dir=self._dir)
+        try:
+            with open(fd, 'wb') as f:
+                self._write_content(f, timeout, value)
+            # link() fails if another process created the entry first
+            os.link(tmp_path, fname)
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp_path)
+
+
+def _stored(response):
+    if isinstance(response, Response):
+        return {"status": response.status_code, "data": response.data}
+    return {
+        "status": response.status_code,
+        "content": response.content,
+        "content_type": response.get('Content-Type'),
+    }
+
+
+def _replay(stored):
+    if "data" in stored:
+        response = Response(stored["data"], status=stored["status"])
+    else:
+        response = HttpResponse(stored["content"], status=stored["status"], content_type=stored["content_type"])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    """Replay the stored response for a repeated Idempotency-Key instead of running the view."""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.META.get(HEADER)
+        if not key:
+            return view(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return JsonResponse({"error": f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters"}, status=400)
+
+        user = getattr(request, 'user', None)
+        owner = user.pk if user is not None and user.is_authenticated else 'anonymous'
+        cache_key = 'idempotency:' + hashlib.sha256(f"{owner}:{request.get_full_path()}:{key}".encode()).hexdigest()
+        claim_key = cache_key + ':claim'
+        fingerprint = hashlib.sha256(request.body).hexdigest()
+        cache = caches['idempotency']
+        claims = caches['idempotency_claims']
+
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT
+        while True:
+            stored = cache.get(cache_key)
+            if stored is not None:
+                if stored["fingerprint"] != fingerprint:
+                    return JsonResponse({"error": "Idempotency-Key was already used with a different request"}, status=422)
+                return _replay(stored)
+            if claims.add(claim_key, fingerprint, timeout=CLAIM_TIMEOUT):
+                break
+            if time.monotonic() >= deadline:
+                return JsonResponse({"error": "A request with this Idempotency-Key is still in progress"}, status=409)
+            time.sleep(POLL_INTERVAL)
+
+        try:
+            response = view(request, *args, **kwargs)
+            # server errors are left retryable
+            if response.status_code < 500:
+                cache.set(cache_key, {"fingerprint": fingerprint, **_stored(response)})
+        finally:
+            claims.delete(claim_key)
+        return response
+
+    return wrapper
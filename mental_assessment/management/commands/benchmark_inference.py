@@ -0,0 +1,186 @@
+import json
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from mental_assessment import backends, sidecar, utils
+from predict_disorder import thread_budget
+
+REFERENCE = 'keras_predict'
+
+
+def _percentile_us(samples, q):
+    return round(float(np.percentile(samples, q)) * 1e6, 1)
+
+
+def _time_single_rows(run, rows):
+    samples = []
+    for row in rows:
+        start = time.perf_counter()
+        run(row[np.newaxis, :])
+        samples.append(time.perf_counter() - start)
+    return {
+        "calls": len(samples),
+        "mean_us": round(float(np.mean(samples)) * 1e6, 1),
+        "p50_us": _percentile_us(samples, 50),
+        "p95_us": _percentile_us(samples, 95),
+        "p99_us": _percentile_us(samples, 99),
+    }
+
+
+def _time_batches(run, features, batch_size, repeats):
+    starts = range(0, len(features) - batch_size + 1, batch_size)
+    if not starts:
+        return None
+    samples = []
+    for i in range(repeats):
+        batch = features[starts[i % len(starts)]:][:batch_size]
+        start = time.perf_counter()
+        run(batch)
+        samples.append(time.perf_counter() - start)
+    return {
+        "batches": len(samples),
+        "mean_us": round(float(np.mean(samples)) * 1e6, 1),
+        "p95_us": _percentile_us(samples, 95),
+        "rows_per_second": round(batch_size / float(np.mean(samples)), 1),
+    }
+
+
+def _synthetic_depression_rows(count, seed):
+    # same encoding as myapp.views.predict_depression, in DEPRESSION_FEATURES order
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        rng.integers(0, 2, count),
+        rng.integers(18, 61, count),
+        rng.integers(0, 6, count),
+        rng.integers(0, 6, count),
+        rng.choice([3, 5.5, 7.5, 10], count),
+        rng.choice([0, 2.5, 5], count),
+        rng.integers(0, 2, count),
+        rng.integers(0, 13, count),
+        rng.integers(1, 6, count),
+        rng.integers(0, 2, count),
+    ]).astype(float)
+
+
+class Command(BaseCommand):
+    help = (
+        "Time single-row and batched inference for every available backend on reproducible "
+        "synthetic questionnaires, and check that they agree with Keras predict()."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000, help="Questionnaires in the equivalence set.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--single-calls', type=int, default=200, help="Timed single-row calls per backend.")
+        parser.add_argument('--batch-sizes', default='1,8,32,128,512')
+        parser.add_argument('--repeats', type=int, default=20, help="Timed batches per batch size.")
+        parser.add_argument('--tolerance', type=float, default=1e-5,
+                            help="Largest allowed absolute difference in class probabilities.")
+        parser.add_argument('--backends', default='', help="Comma-separated subset of backends to run.")
+        parser.add_argument('--output', default='', help="Write the JSON report here instead of stdout.")
+
+    def handle(self, *args, **options):
+        model = utils.load_general_model()
+        if model is None or utils.label_encoder is None:
+            raise CommandError("Could not load the general model or label encoder")
+
+        runners = {name: factory(model) for name, factory in backends.BACKENDS.items()}
+        if sidecar.status().get("reachable"):
+            runners['sidecar'] = lambda features: sidecar.get_client().call([(sidecar.OP_GENERAL, features)])[0]
+        if options['backends']:
+            wanted = {name.strip() for name in options['backends'].split(',')}
+            unknown = wanted - set(runners)
+            if unknown:
+                raise CommandError(f"Unknown or unavailable backends: {', '.join(sorted(unknown))}")
+            runners = {name: run for name, run in runners.items() if name in wanted or name == REFERENCE}
+
+        batch_sizes = [int(size) for size in options['batch_sizes'].split(',')]
+        features = utils.synthetic_answers(options['rows'], options['seed']).astype(np.float32)
+        expected_scores = runners[REFERENCE](features)
+        expected_labels = np.argmax(expected_scores, axis=1)
+        expected_probabilities = backends.softmax(np.asarray(expected_scores, dtype=np.float64))
+
+        report = {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "environment": {
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "tensorflow": getattr(sys.modules.get('tensorflow'), '__version__', None),
+                "threads": thread_budget.effective(),
+            },
+            "seed": options['seed'],
+            "rows": options['rows'],
+            "tolerance": options['tolerance'],
+            "reference": REFERENCE,
+            "reference_labels": {
+                label: int(count) for label, count in
+                zip(*np.unique(utils.label_encoder.inverse_transform(expected_labels), return_counts=True))
+            },
+            "general": {},
+        }
+        ok = True
+
+        for name, run in runners.items():
+            self.stderr.write(f"general/{name}")
+            run(features[:1])  # warm up (tracing, connections)
+            output = np.asarray(run(features))
+            if output.ndim == 1:
+                # compiled_indices and the sidecar return class indices only
+                labels, max_diff = output, None
+            else:
+                labels = np.argmax(output, axis=1)
+                probabilities = backends.softmax(np.asarray(output, dtype=np.float64))
+                max_diff = float(np.max(np.abs(probabilities - expected_probabilities)))
+            mismatches = int(np.sum(labels != expected_labels))
+            equivalent = mismatches == 0 and (max_diff is None or max_diff <= options['tolerance'])
+            ok = ok and equivalent
+
+            report["general"][name] = {
+                "equivalence": {
+                    "label_mismatches": mismatches,
+                    "max_abs_probability_diff": max_diff,
+                    "ok": equivalent,
+                },
+                "single_row": _time_single_rows(run, features[:options['single_calls']]),
+                "batched": {
+                    str(size): _time_batches(run, features, size, options['repeats'])
+                    for size in batch_sizes
+                },
+            }
+
+        report["depression"] = self._depression(options)
+        ok = ok and all(entry["equivalence"]["ok"] for entry in report["depression"].values())
+        report["ok"] = ok
+
+        text = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(text + '\n')
+        else:
+            self.stdout.write(text)
+        if not ok:
+            raise CommandError("Backends disagree with the reference; see the report")
+
+    def _depression(self, options):
+        if utils.load_depression_model()[0] is None:
+            return {}
+        runners = {'sklearn': utils.run_depression_model}
+        if sidecar.status().get("reachable"):
+            runners['sidecar'] = lambda rows: sidecar.get_client().call([(sidecar.OP_DEPRESSION, rows)])[0]
+
+        rows = _synthetic_depression_rows(options['rows'], options['seed'])
+        expected = np.asarray(runners['sklearn'](rows)).astype(int)
+        results = {}
+        for name, run in runners.items():
+            self.stderr.write(f"depression/{name}")
+            mismatches = int(np.sum(np.asarray(run(rows)).astype(int) != expected))
+            results[name] = {
+                "equivalence": {"label_mismatches": mismatches, "ok": mismatches == 0},
+                "single_row": _time_single_rows(run, rows[:options['single_calls']]),
+            }
+        return results
@@ -0,0 +1,93 @@
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from mental_assessment import backends, quantized, utils
+
+RESULT_MODELS = ['mental_assessment.GeneralTestResult', 'myapp.GeneralTestResult']
+
+
+def _stored_answers(limit):
+    """Up to ``limit`` of the most recent valid stored answer vectors."""
+    width = len(utils.FEATURES_NAME)
+    rows = []
+    for label in RESULT_MODELS:
+        answers = apps.get_model(label).objects.order_by('-pk').values_list('answers', flat=True)
+        for row in answers.iterator(chunk_size=1000):
+            if len(rows) >= limit:
+                return rows
+            if isinstance(row, list) and len(row) == width:
+                try:
+                    rows.append([float(value) for value in row])
+                except (TypeError, ValueError):
+                    pass
+    return rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the general model's weights as float16 or per-channel int8 next to the .h5 file. "
+        "Refuses unless the reduced-precision model predicts the same labels as the float32 model "
+        "on at least --threshold of the reference questionnaires."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dtype', choices=quantized.DTYPES, default='float16')
+        parser.add_argument('--output', default='',
+                            help="Artifact path (default: ml_models/general_model.<dtype>.npz).")
+        parser.add_argument('--threshold', type=float, default=0.995,
+                            help="Minimum fraction of reference questionnaires whose label must match.")
+        parser.add_argument('--reference', choices=['auto', 'stored', 'synthetic'], default='auto',
+                            help="Stored GeneralTestResult answers, synthetic ones, or stored topped up "
+                                 "with synthetic (auto).")
+        parser.add_argument('--samples', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        model = utils.load_general_model()
+        if model is None:
+            raise CommandError(f"Could not load {utils.MODEL_PATH}")
+        layers = backends.dense_layers(model)
+
+        samples = options['samples']
+        stored = _stored_answers(samples) if options['reference'] != 'synthetic' else []
+        if options['reference'] == 'stored' and not stored:
+            raise CommandError("No stored answers to check against")
+        synthetic_count = samples - len(stored) if options['reference'] != 'stored' else 0
+        reference = np.array(stored, dtype=np.float32).reshape(-1, len(utils.FEATURES_NAME))
+        if synthetic_count:
+            reference = np.vstack([reference, utils.synthetic_answers(synthetic_count, options['seed']).astype(np.float32)])
+
+        expected = np.argmax(backends.keras_call(model)(reference), axis=1)
+        candidate = quantized.QuantizedModel(quantized.quantize(layers, options['dtype']))
+        agreement = float(np.mean(np.argmax(candidate(reference), axis=1) == expected))
+
+        self.stdout.write(
+            f"{options['dtype']}: {agreement:.4%} label agreement on {len(reference)} questionnaires "
+            f"({len(stored)} stored, {synthetic_count} synthetic); threshold {options['threshold']:.4%}"
+        )
+        if agreement < options['threshold']:
+            raise CommandError("Agreement below threshold; no artifact written")
+
+        output = options['output'] or os.path.join(
+            os.path.dirname(utils.MODEL_PATH), f"general_model.{options['dtype']}.npz"
+        )
+        quantized.save(output, quantized.quantize(
+            layers,
+            options['dtype'],
+            source=utils.MODEL_PATH,
+            created_at=datetime.now(timezone.utc).isoformat(),
+            agreement=agreement,
+            reference={"stored": len(stored), "synthetic": synthetic_count},
+        ))
+
+        h5_size = os.path.getsize(utils.MODEL_PATH)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {output}: weights {candidate.nbytes} bytes vs {candidate.float32_nbytes} as float32 "
+            f"({1 - candidate.nbytes / candidate.float32_nbytes:.0%} smaller); "
+            f"file {os.path.getsize(output)} bytes vs {h5_size} for the .h5. "
+            f"Serve it with GENERAL_MODEL_WEIGHTS={output}"
+        ))
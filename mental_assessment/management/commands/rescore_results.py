@@ -0,0 +1,173 @@
+import csv
+import hashlib
+import json
+import os
+from collections import Counter
+
+import numpy as np
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from mental_assessment import backends, utils
+
+TABLES = {
+    'myapp': 'myapp.GeneralTestResult',
+    'mental_assessment': 'mental_assessment.GeneralTestResult',
+}
+UPDATE_FIELDS = ['predicted_disorder', 'description', 'suggestions', 'video_url']
+
+
+def _decode(rows):
+    """(pks, stored labels, answers matrix) for the rows whose answers are 28 numbers."""
+    width = len(utils.FEATURES_NAME)
+    kept = [row for row in rows if isinstance(row[1], list) and len(row[1]) == width]
+    try:
+        matrix = np.array([answers for _, answers, _ in kept], dtype=np.float32).reshape(-1, width)
+    except (TypeError, ValueError):
+        # a malformed answer somewhere in the chunk; fall back to checking row by row
+        decoded = []
+        for row in kept:
+            try:
+                decoded.append((row, np.array(row[1], dtype=np.float32)))
+            except (TypeError, ValueError):
+                pass
+        kept = [row for row, _ in decoded]
+        matrix = np.array([answers for _, answers in decoded], dtype=np.float32).reshape(-1, width)
+    return [pk for pk, _, _ in kept], [stored for _, _, stored in kept], matrix
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-score stored general test results with a (new) general model in primary-key order, "
+        "in fixed-size chunks. Writes a diff report and, with --apply, updates the stored "
+        "predictions. Progress is checkpointed; run several copies on disjoint --start-pk/--end-pk ranges "
+        "to work in parallel."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', default=utils.MODEL_PATH, help="Keras model to score with.")
+        parser.add_argument('--tables', default=','.join(TABLES), help="Comma-separated subset of: " + ', '.join(TABLES))
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--start-pk', type=int, default=None, help="First primary key to scan (inclusive).")
+        parser.add_argument('--end-pk', type=int, default=None, help="Last primary key to scan (inclusive).")
+        parser.add_argument('--report', default='', help="CSV file for rows whose prediction changes.")
+        parser.add_argument('--apply', action='store_true', help="Update the stored predictions.")
+        parser.add_argument('--checkpoint', default='',
+                            help="Progress file (default: derived from the key range and mode). Delete it to start over.")
+
+    def handle(self, *args, **options):
+        tables = [name.strip() for name in options['tables'].split(',') if name.strip()]
+        unknown = set(tables) - set(TABLES)
+        if unknown:
+            raise CommandError(f"Unknown tables: {', '.join(sorted(unknown))}")
+        if utils.label_encoder is None:
+            raise CommandError("Could not load the label encoder")
+
+        try:
+            from tensorflow.keras.models import load_model
+            model = load_model(options['model'])
+        except Exception as e:
+            raise CommandError(f"Could not load {options['model']}: {e}")
+        try:
+            run = backends.numpy_forward(model)
+        except ValueError:
+            run = backends.keras_call(model)
+        classes = np.asarray(utils.label_encoder.classes_)
+
+        start, end = options['start_pk'], options['end_pk']
+        mode = 'apply' if options['apply'] else 'dry-run'
+        checkpoint_path = options['checkpoint'] or f"rescore_{start or 'first'}-{end or 'last'}.{mode}.checkpoint.json"
+        run_id = {"mode": mode, "model": os.path.abspath(options['model']), "model_sha256": _file_sha256(options['model'])}
+        checkpoint = {**run_id, "last_pk": {}}
+        if os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as f:
+                saved = json.load(f)
+            mismatched = [key for key in run_id if saved.get(key) != run_id[key]]
+            if mismatched:
+                raise CommandError(
+                    f"{checkpoint_path} was written by a run with a different {', '.join(mismatched)} "
+                    f"({', '.join(f'{key}={saved.get(key)}' for key in mismatched)}); "
+                    "delete it or pass another --checkpoint"
+                )
+            checkpoint = saved
+            self.stdout.write(f"Resuming from {checkpoint_path}: {checkpoint['last_pk']}")
+
+        report = None
+        if options['report']:
+            report_exists = os.path.exists(options['report'])
+            report_file = open(options['report'], 'a', newline='')
+            report = csv.writer(report_file)
+            if not report_exists:
+                report.writerow(['table', 'id', 'stored', 'rescored'])
+
+        try:
+            for table in tables:
+                self._rescore_table(table, run, classes, start, end, options, checkpoint, checkpoint_path, report)
+        finally:
+            if report is not None:
+                report_file.close()
+
+    def _rescore_table(self, table, run, classes, start, end, options, checkpoint, checkpoint_path, report):
+        model_class = apps.get_model(TABLES[table])
+        queryset = model_class.objects.all()
+        if end is not None:
+            queryset = queryset.filter(pk__lte=end)
+        last_pk = checkpoint["last_pk"].get(table, start - 1 if start is not None else None)
+
+        scanned = skipped = changed = 0
+        transitions = Counter()
+        while True:
+            chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            rows = list(chunk.order_by('pk').values_list('pk', 'answers', 'predicted_disorder')[:options['chunk_size']])
+            if not rows:
+                break
+
+            pks, stored, matrix = _decode(rows)
+            labels = classes[np.argmax(run(matrix), axis=1)] if len(pks) else []
+            diffs = [
+                (pk, old, str(new))
+                for pk, old, new in zip(pks, stored, labels)
+                if old != new
+            ]
+
+            if report is not None:
+                report.writerows([table, pk, old, new] for pk, old, new in diffs)
+            if options['apply'] and diffs:
+                updates = []
+                for pk, _, new in diffs:
+                    info = utils.INFO.get(new, {"description": "No clear match found.", "suggestions": [], "video": ""})
+                    updates.append(model_class(
+                        pk=pk,
+                        predicted_disorder=new,
+                        description=info["description"],
+                        suggestions=info["suggestions"],
+                        video_url=info["video"],
+                    ))
+                with transaction.atomic():
+                    model_class.objects.bulk_update(updates, UPDATE_FIELDS)
+
+            scanned += len(rows)
+            skipped += len(rows) - len(pks)
+            changed += len(diffs)
+            transitions.update((old, new) for _, old, new in diffs)
+            last_pk = rows[-1][0]
+
+            checkpoint["last_pk"][table] = last_pk
+            with open(checkpoint_path + '.tmp', 'w') as f:
+                json.dump(checkpoint, f)
+            os.replace(checkpoint_path + '.tmp', checkpoint_path)
+            self.stdout.write(f"{table}: up to id {last_pk}, {scanned} scanned, {changed} changed, {skipped} skipped")
+
+        action = "updated" if options['apply'] else "would change"
+        self.stdout.write(self.style.SUCCESS(f"{table}: {scanned} scanned this run, {changed} {action}, {skipped} skipped"))
+        for (old, new), count in transitions.most_common():
+            self.stdout.write(f"  {old} -> {new}: {count}")
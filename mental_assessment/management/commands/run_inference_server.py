@@ -0,0 +1,44 @@
+import os
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from mental_assessment import sidecar, utils
+
+
+class Command(BaseCommand):
+    help = "Serve the general and depression models to the web workers over a Unix socket."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--socket',
+            default=settings.INFERENCE_SOCKET or '/tmp/predict_disorder_inference.sock',
+            help="Path of the Unix socket to listen on (defaults to INFERENCE_SOCKET).",
+        )
+
+    def handle(self, *args, **options):
+        if not utils.general_model_ready():
+            raise CommandError("Could not load the general model")
+        handlers = {sidecar.OP_GENERAL: utils.run_general_model}
+        if utils.load_depression_model()[0] is not None:
+            handlers[sidecar.OP_DEPRESSION] = utils.run_depression_model
+        else:
+            self.stderr.write("Depression model not loaded; workers will score it in-process")
+
+        # stop on SIGTERM the same way as on Ctrl-C so the socket file is removed
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+        path = options['socket']
+        server = sidecar.InferenceServer(path, handlers)
+        self.stdout.write(self.style.SUCCESS(f"Inference server listening on {path}"))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,84 @@
+"""
+Reduced-precision copies of the general model's weights.
+
+``quantize_general_model`` writes the Dense kernels as float16, or as int8
+with one float32 scale per output unit (symmetric, per channel), next to
+``general_model.h5``. Biases stay float32. Setting
+``GENERAL_MODEL_WEIGHTS`` to such a file serves predictions from it with a
+NumPy forward pass that dequantizes on the fly, without loading TensorFlow.
+"""
+import json
+
+import numpy as np
+
+from . import backends
+
+DTYPES = ('float16', 'int8')
+
+
+def quantize(layers, dtype, **meta):
+    """npz arrays, plus a JSON ``meta`` entry, for (kernel, bias, activation) layers stored as ``dtype``."""
+    if dtype not in DTYPES:
+        raise ValueError(f"dtype must be one of {', '.join(DTYPES)}")
+    arrays = {}
+    for i, (kernel, bias, _) in enumerate(layers):
+        if dtype == 'float16':
+            arrays[f"kernel_{i}"] = kernel.astype(np.float16)
+        else:
+            scale = np.abs(kernel).max(axis=0) / 127
+            scale[scale == 0] = 1
+            arrays[f"kernel_{i}"] = np.clip(np.round(kernel / scale), -127, 127).astype(np.int8)
+            arrays[f"scale_{i}"] = scale.astype(np.float32)
+        arrays[f"bias_{i}"] = bias.astype(np.float32)
+    meta = {**meta, "dtype": dtype, "activations": [activation for _, _, activation in layers]}
+    arrays["meta"] = np.array(json.dumps(meta))
+    return arrays
+
+
+def save(path, arrays):
+    with open(path, 'wb') as f:
+        np.savez(f, **arrays)
+
+
+class QuantizedModel:
+
+    def __init__(self, arrays):
+        self.meta = json.loads(str(arrays["meta"]))
+        self.dtype = self.meta["dtype"]
+        self.layers = []
+        for i, activation in enumerate(self.meta["activations"]):
+            scale = arrays[f"scale_{i}"] if f"scale_{i}" in arrays else None
+            self.layers.append((arrays[f"kernel_{i}"], scale, arrays[f"bias_{i}"], activation))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as npz:
+            return cls({name: npz[name] for name in npz.files})
+
+    def __call__(self, features):
+        out = np.asarray(features, dtype=np.float32)
+        for kernel, scale, bias, activation in self.layers:
+            out = out @ kernel.astype(np.float32)
+            if scale is not None:
+                # x @ (q * s) == (x @ q) * s for a per-column scale
+                out *= scale
+            out = backends.ACTIVATIONS[activation](out + bias)
+        return out
+
+    def dense_layers(self):
+        """Dequantized float32 (kernel, bias, activation) layers, as backends.dense_layers returns."""
+        return [
+            (kernel.astype(np.float32) * (scale if scale is not None else 1), bias, activation)
+            for kernel, scale, bias, activation in self.layers
+        ]
+
+    @property
+    def nbytes(self):
+        return sum(
+            kernel.nbytes + bias.nbytes + (scale.nbytes if scale is not None else 0)
+            for kernel, scale, bias, _ in self.layers
+        )
+
+    @property
+    def float32_nbytes(self):
+        return sum((kernel.size + bias.size) * 4 for kernel, _, bias, _ in self.layers)
@@ -0,0 +1,232 @@
+"""
+Shadow evaluation of a candidate general model on live traffic.
+
+With ``SHADOW_MODEL_PATH`` set, ``SHADOW_SAMPLE_RATE`` of the validated
+answer vectors scored by ``predict_labels`` are put on a bounded in-memory
+queue together with the live label. Background threads score them with the
+candidate model in batches and count agreement and confusion per disorder.
+The request only pays for a random draw and a non-blocking put; when the
+queue is full the sample is dropped and counted.
+
+The candidate must predict the same classes as the live label encoder. It
+is loaded once per process and shared by the scoring threads. Each worker
+writes its counts to ``SHADOW_STATS_DIR`` tagged with the candidate's
+identity (path, size and mtime); ``shadow_stats`` sums the files for the
+current candidate across workers, so counts for an earlier candidate are
+not mixed in. When a worker starts scoring it deletes other candidates'
+files and folds the files of this host's exited workers into one rollup
+file per candidate, so the directory doesn't grow with worker restarts.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import queue
+import random
+import socket
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from . import backends
+
+_lock = threading.Lock()
+_queue = None
+_pid = None
+_disabled = False
+_stats_file = None
+_stats = None
+
+
+def _empty_stats():
+    return {"scored": 0, "agreed": 0, "dropped": 0, "failed": 0, "per_disorder": {}, "confusion": {}}
+
+
+def candidate_id():
+    """Identity of the configured candidate model file, or None if it can't be read."""
+    try:
+        stat = os.stat(settings.SHADOW_MODEL_PATH)
+    except OSError:
+        return None
+    return f"{os.path.abspath(settings.SHADOW_MODEL_PATH)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def _start():
+    global _queue, _pid, _stats, _stats_file
+    _queue = queue.Queue(maxsize=settings.SHADOW_QUEUE_SIZE)
+    _pid = os.getpid()
+    _stats = {**_empty_stats(), "candidate": candidate_id(), "host": socket.gethostname(), "pid": _pid}
+    _stats_file = os.path.join(
+        settings.SHADOW_STATS_DIR, f"{socket.gethostname()}-{_pid}-{int(time.time())}.json"
+    )
+    # loading happens off the request thread; samples queue up meanwhile
+    threading.Thread(target=_load_and_work, args=(_queue,), name='shadow-load', daemon=True).start()
+
+
+def submit(answers_numeric, live_label):
+    """Queue one live prediction for shadow scoring; never blocks."""
+    if not settings.SHADOW_MODEL_PATH or _disabled or random.random() >= settings.SHADOW_SAMPLE_RATE:
+        return
+    if _pid != os.getpid():
+        # first sample in this process (threads don't survive a fork)
+        with _lock:
+            if _pid != os.getpid():
+                _start()
+    try:
+        _queue.put_nowait((answers_numeric, str(live_label)))
+    except queue.Full:
+        with _lock:
+            _stats["dropped"] += 1
+
+
+def _load_candidate():
+    from tensorflow.keras.models import load_model
+    model = load_model(settings.SHADOW_MODEL_PATH)
+    try:
+        return backends.numpy_forward(model)
+    except ValueError:
+        return backends.keras_call(model)
+
+
+def _load_and_work(samples):
+    global _disabled
+    try:
+        _prune(_stats["candidate"])
+    except OSError as e:
+        print("⚠️ Could not prune shadow stats:", e)
+    try:
+        run = _load_candidate()
+    except Exception as e:
+        print("❌ Could not load shadow model, shadow evaluation disabled:", e)
+        _disabled = True
+        return
+    for _ in range(max(1, settings.SHADOW_WORKERS) - 1):
+        threading.Thread(target=_work, args=(samples, run), name='shadow-eval', daemon=True).start()
+    _work(samples, run)
+
+
+def _work(samples, run):
+    from .utils import label_encoder
+    while True:
+        batch = [samples.get()]
+        while len(batch) < settings.SHADOW_BATCH_SIZE:
+            try:
+                batch.append(samples.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            features = np.array([answers for answers, _ in batch], dtype=np.float32)
+            candidate_labels = label_encoder.inverse_transform(np.argmax(run(features), axis=1))
+        except Exception as e:
+            print("⚠️ Shadow scoring failed:", e)
+            with _lock:
+                _stats["failed"] += len(batch)
+            continue
+        _record([live for _, live in batch], candidate_labels)
+
+
+def _record(live_labels, candidate_labels):
+    with _lock:
+        for live, candidate in zip(live_labels, candidate_labels):
+            candidate = str(candidate)
+            agreed = live == candidate
+            _stats["scored"] += 1
+            _stats["agreed"] += agreed
+            disorder = _stats["per_disorder"].setdefault(live, {"scored": 0, "agreed": 0})
+            disorder["scored"] += 1
+            disorder["agreed"] += agreed
+            row = _stats["confusion"].setdefault(live, {})
+            row[candidate] = row.get(candidate, 0) + 1
+        snapshot = json.dumps(_stats)
+    try:
+        os.makedirs(settings.SHADOW_STATS_DIR, exist_ok=True)
+        with open(_stats_file + '.tmp', 'w') as f:
+            f.write(snapshot)
+        os.replace(_stats_file + '.tmp', _stats_file)
+    except OSError as e:
+        print("⚠️ Could not save shadow stats:", e)
+
+
+def _read_stats(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _merge(total, stats):
+    for key in ("scored", "agreed", "dropped", "failed"):
+        total[key] += stats[key]
+    for disorder, counts in stats["per_disorder"].items():
+        entry = total["per_disorder"].setdefault(disorder, {"scored": 0, "agreed": 0})
+        entry["scored"] += counts["scored"]
+        entry["agreed"] += counts["agreed"]
+    for live, row in stats["confusion"].items():
+        merged = total["confusion"].setdefault(live, {})
+        for candidate, count in row.items():
+            merged[candidate] = merged.get(candidate, 0) + count
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _prune(current):
+    """Delete other candidates' stats files; fold this host's exited workers' files into the rollup."""
+    directory = settings.SHADOW_STATS_DIR
+    os.makedirs(directory, exist_ok=True)
+    rollup_path = os.path.join(directory, f"rollup-{hashlib.sha256(str(current).encode()).hexdigest()[:16]}.json")
+    host = socket.gethostname()
+    with open(os.path.join(directory, '.lock'), 'w') as lock:
+        # one worker at a time, so a file is never folded in twice
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        rollup = _read_stats(rollup_path) or {**_empty_stats(), "candidate": current}
+        folded = []
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if not name.endswith('.json') or path == rollup_path:
+                continue
+            stats = _read_stats(path)
+            if stats is None or current is None or stats.get("candidate") != current:
+                os.remove(path)
+            elif stats.get("host") == host and stats.get("pid") != os.getpid() and not _alive(stats.get("pid", 0)):
+                _merge(rollup, stats)
+                folded.append(path)
+        if folded:
+            with open(rollup_path + '.tmp', 'w') as f:
+                json.dump(rollup, f)
+            os.replace(rollup_path + '.tmp', rollup_path)
+            for path in folded:
+                os.remove(path)
+
+
+def shadow_stats():
+    """Counts for the current candidate summed over every worker's stats file, plus this worker's queue state."""
+    total = _empty_stats()
+    current = candidate_id()
+    try:
+        names = [name for name in os.listdir(settings.SHADOW_STATS_DIR) if name.endswith('.json')]
+    except FileNotFoundError:
+        names = []
+    for name in names:
+        stats = _read_stats(os.path.join(settings.SHADOW_STATS_DIR, name))
+        if stats is not None and current is not None and stats.get("candidate") == current:
+            _merge(total, stats)
+
+    total["agreement"] = total["agreed"] / total["scored"] if total["scored"] else None
+    for counts in total["per_disorder"].values():
+        counts["agreement"] = counts["agreed"] / counts["scored"]
+    total["candidate"] = settings.SHADOW_MODEL_PATH
+    total["candidate_id"] = current
+    total["sample_rate"] = settings.SHADOW_SAMPLE_RATE
+    total["queued_in_this_worker"] = _queue.qsize() if _queue is not None and _pid == os.getpid() else 0
+    return total
@@ -0,0 +1,232 @@
+"""
+Local inference sidecar.
+
+One process (``manage.py run_inference_server``) loads the general and
+depression models and serves the web workers over a Unix domain socket, so
+N gunicorn workers share a single copy of TensorFlow and the models.
+
+Wire format, little endian, one frame per request::
+
+    request   <IBBH  request id, op, 0, rows>       + rows * cols float32
+    response  <IBBH  request id, status, 0, rows>   + rows int32 class indices
+
+A connection may carry several requests before the replies are read
+(pipelining); the replies come back in request order.
+"""
+import itertools
+import os
+import queue
+import socket
+import socketserver
+import struct
+import time
+
+import numpy as np
+from django.conf import settings
+
+HEADER = struct.Struct('<IBBH')
+MAX_ROWS = 0xFFFF
+
+OP_PING = 0
+OP_GENERAL = 1
+OP_DEPRESSION = 2
+COLUMNS = {OP_PING: 0, OP_GENERAL: 28, OP_DEPRESSION: 10}
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+FLOAT = np.dtype('<f4')
+INDEX = np.dtype('<i4')
+
+
+class SidecarError(Exception):
+    pass
+
+
+class SidecarRejected(SidecarError):
+    """The server is up but could not score the request."""
+
+
+def _recv_exact(conn, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise SidecarError("connection closed by the inference server")
+        data += chunk
+    return bytes(data)
+
+
+# ---------------------------------------------------------------------
+# Server
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        reader = self.request.makefile('rb')
+        while True:
+            header = reader.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            request_id, op, _, rows = HEADER.unpack(header)
+            cols = COLUMNS.get(op)
+            if cols is None:
+                # the payload length is unknown, so the stream can't be resynced
+                self.request.sendall(HEADER.pack(request_id, STATUS_ERROR, 0, 0))
+                return
+            payload = reader.read(rows * cols * FLOAT.itemsize)
+            if len(payload) < rows * cols * FLOAT.itemsize:
+                return
+            self.request.sendall(self.server.answer(request_id, op, rows, cols, payload))
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, handlers):
+        # handlers maps an op to a function taking a float32 matrix and returning class indices
+        self.handlers = handlers
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, _RequestHandler)
+        os.chmod(path, 0o660)
+
+    def answer(self, request_id, op, rows, cols, payload):
+        if op == OP_PING:
+            return HEADER.pack(request_id, STATUS_OK, 0, 0)
+        try:
+            features = np.frombuffer(payload, dtype=FLOAT).reshape(rows, cols)
+            result = np.asarray(self.handlers[op](features), dtype=INDEX)
+        except Exception as e:
+            print("❌ Inference sidecar error:", e)
+            return HEADER.pack(request_id, STATUS_ERROR, 0, 0)
+        return HEADER.pack(request_id, STATUS_OK, 0, len(result)) + result.tobytes()
+
+
+# ---------------------------------------------------------------------
+# Client
+
+class InferenceClient:
+    """Pooled client; each call pipelines its requests over one connection."""
+
+    def __init__(self, path, pool_size=4, timeout=2.0, retry_after=5.0):
+        self.path = path
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.pid = os.getpid()
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._ids = itertools.count(1)
+        self._down_until = 0.0
+
+    def available(self):
+        return time.monotonic() >= self._down_until
+
+    def mark_down(self):
+        self._down_until = time.monotonic() + self.retry_after
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _acquire(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.settimeout(self.timeout)
+            try:
+                conn.connect(self.path)
+            except OSError:
+                conn.close()
+                raise
+            return conn
+
+    def _release(self, conn):
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def call(self, requests):
+        """Send (op, rows) requests back to back, then read one reply per request."""
+        frames = []
+        request_ids = []
+        for op, rows in requests:
+            cols = COLUMNS[op]
+            features = np.ascontiguousarray(rows, dtype=FLOAT).reshape(-1, cols) if cols else np.empty((0, 0), FLOAT)
+            if len(features) > MAX_ROWS:
+                raise SidecarError(f"at most {MAX_ROWS} rows per request")
+            request_id = next(self._ids) & 0xFFFFFFFF
+            request_ids.append(request_id)
+            frames.append(HEADER.pack(request_id, op, 0, len(features)))
+            frames.append(features.tobytes())
+
+        conn = self._acquire()
+        try:
+            conn.sendall(b''.join(frames))
+            results = []
+            failed = False
+            for request_id in request_ids:
+                reply_id, status, _, rows = HEADER.unpack(_recv_exact(conn, HEADER.size))
+                body = _recv_exact(conn, rows * INDEX.itemsize)
+                if reply_id != request_id:
+                    raise SidecarError("reply out of order")
+                failed = failed or status != STATUS_OK
+                results.append(np.frombuffer(body, dtype=INDEX))
+        except BaseException:
+            conn.close()
+            raise
+        self._release(conn)
+        if failed:
+            raise SidecarRejected("inference server could not score the request")
+        return results
+
+    def ping(self):
+        self.call([(OP_PING, [])])
+
+
+_client = None
+
+
+def get_client():
+    """The process's client, or None when no sidecar is configured."""
+    global _client
+    if not settings.INFERENCE_SOCKET:
+        return None
+    # a client inherited through fork would share its sockets with the parent
+    if _client is None or _client.pid != os.getpid():
+        _client = InferenceClient(
+            settings.INFERENCE_SOCKET,
+            pool_size=settings.INFERENCE_POOL_SIZE,
+            timeout=settings.INFERENCE_TIMEOUT,
+            retry_after=settings.INFERENCE_RETRY_AFTER,
+        )
+    return _client
+
+
+def predict(op, rows):
+    """Class indices from the sidecar, or None if it is not configured or unavailable."""
+    client = get_client()
+    if client is None or not client.available():
+        return None
+    try:
+        return client.call([(op, rows)])[0]
+    except SidecarRejected:
+        return None
+    except (OSError, SidecarError) as e:
+        print("⚠️ Inference sidecar unavailable, using in-process models:", e)
+        client.mark_down()
+        return None
+
+
+def status():
+    client = get_client()
+    if client is None:
+        return {"configured": False}
+    try:
+        client.ping()
+        reachable = True
+    except (OSError, SidecarError):
+        reachable = False
+    return {"configured": True, "socket": client.path, "reachable": reachable}
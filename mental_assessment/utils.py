@@ -1,18 +1,116 @@
+import hashlib
+import json
 import os
 import numpy as np
-from tensorflow.keras.models import load_model
 import joblib
+from django.conf import settings
+
+from . import backends, shadow, sidecar
+from .quantized import QuantizedModel
 
 MODEL_PATH = os.path.join('ml_models', 'general_model.h5')
 ENCODER_PATH = os.path.join('ml_models', 'label_encoder.pkl')
+DEPRESSION_MODEL_PATH = os.path.join('ml_models', 'depression_model.pkl')
+SCALER_PATH = os.path.join('ml_models', 'scaler.pkl')
+
+# The models are loaded once per process. With an inference sidecar
+# configured (settings.INFERENCE_SOCKET) the workers leave TensorFlow and the
+# models to the sidecar and only load them here if it is unreachable. With
+# settings.GENERAL_MODEL_WEIGHTS set, the general model is served from that
+# reduced-precision copy instead of the .h5 file, without TensorFlow; if that
+# file can't be loaded the .h5 model serves instead.
+model = None
+quantized_model = None
+label_encoder = None
+depression_model = None
+scaler = None
+_load_attempted = set()
+_compiled_general = None
+
+
+def load_general_model():
+    global model
+    if model is None and 'general' not in _load_attempted:
+        _load_attempted.add('general')
+        try:
+            from tensorflow.keras.models import load_model
+            model = load_model(MODEL_PATH)
+        except Exception as e:
+            print("Error loading model:", e)
+    return model
+
+
+def load_quantized_model():
+    global quantized_model
+    if quantized_model is None and 'quantized' not in _load_attempted:
+        _load_attempted.add('quantized')
+        try:
+            quantized_model = QuantizedModel.load(settings.GENERAL_MODEL_WEIGHTS)
+        except Exception as e:
+            print(f"Error loading quantized model weights, falling back to {MODEL_PATH}:", e)
+    return quantized_model
+
+
+def use_quantized_model():
+    """True when GENERAL_MODEL_WEIGHTS is set and loads; otherwise the .h5 model serves."""
+    return bool(settings.GENERAL_MODEL_WEIGHTS) and load_quantized_model() is not None
+
+
+def general_model_ready():
+    """Load whichever form of the general model is configured; False if it can't be loaded."""
+    if use_quantized_model():
+        return True
+    return load_general_model() is not None
+
+
+def served_general_layers():
+    """float32 (kernel, bias, activation) layers of the general model as served, or None."""
+    if use_quantized_model():
+        return quantized_model.dense_layers()
+    # read from the file so workers that use the sidecar don't load TensorFlow for this
+    try:
+        return backends.h5_dense_layers(MODEL_PATH)
+    except Exception as e:
+        print("Error reading general model weights:", e)
+        return None
+
+
+def weights_report():
+    """Memory held by the in-process general model's weights."""
+    if quantized_model is not None:
+        return {
+            "format": quantized_model.dtype,
+            "bytes": quantized_model.nbytes,
+            "float32_bytes": quantized_model.float32_nbytes,
+            "saved_bytes": quantized_model.float32_nbytes - quantized_model.nbytes,
+        }
+    if model is not None:
+        return {"format": "float32", "bytes": sum(w.nbytes for w in model.get_weights())}
+    return None
+
+
+def load_depression_model():
+    global depression_model, scaler
+    if depression_model is None and 'depression' not in _load_attempted:
+        _load_attempted.add('depression')
+        try:
+            depression_model = joblib.load(DEPRESSION_MODEL_PATH)
+            scaler = joblib.load(SCALER_PATH)
+        except Exception as e:
+            print("Error loading depression model or scaler:", e)
+            depression_model = None
+            scaler = None
+    return depression_model, scaler
+
 
 try:
-    model = load_model(MODEL_PATH)
     label_encoder = joblib.load(ENCODER_PATH)
 except Exception as e:
-    print("Error loading model or encoder:", e)
-    model = None
-    label_encoder = None
+    print("Error loading encoder:", e)
+
+if not settings.INFERENCE_SOCKET:
+    general_model_ready()
+    load_depression_model()
 
 FEATURES_NAME = [
     'ag+1:629e', 'feeling.nervous', 'panic', 'breathing.rapidly', 'sweating',
@@ -88,18 +186,117 @@ INFO = {
                     
                 }
 }
+# Versioned catalog of the INFO entries for /api/disorders/. Compact
+# prediction and history responses send only the disorder id and the
+# catalog version; clients join against their cached copy of the catalog.
+DISORDER_IDS = {name: i for i, name in enumerate(sorted(INFO))}
+CATALOG = [
+    {
+        "id": DISORDER_IDS[name],
+        "name": name,
+        "description": INFO[name]["description"],
+        "suggestions": INFO[name]["suggestions"],
+        "video": INFO[name]["video"],
+    }
+    for name in sorted(INFO)
+]
+CATALOG_VERSION = hashlib.sha256(json.dumps(CATALOG, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+CATALOG_JSON = json.dumps({"version": CATALOG_VERSION, "disorders": CATALOG})
+
+
+def wants_compact(request):
+    return request.GET.get('compact', '').lower() in ('1', 'true', 'yes')
+
+
+def compact_prediction(predicted_disorder):
+    return {
+        "disorder_id": DISORDER_IDS.get(predicted_disorder),
+        "predicted_disorder": predicted_disorder,
+        "catalog_version": CATALOG_VERSION,
+    }
+
+
+def synthetic_answers(count, seed=0):
+    """Reproducible random questionnaires over FEATURES_NAME: an age, then 27 yes/no answers."""
+    rng = np.random.default_rng(seed)
+    answers = (rng.random((count, len(FEATURES_NAME))) < 0.4).astype(float)
+    answers[:, 0] = rng.integers(10, 71, size=count)
+    return answers
+
+
+DEPRESSION_FEATURES = [
+    'Gender', 'Age', 'Work Pressure', 'Job Satisfaction',
+    'Sleep Duration', 'Dietary Habits',
+    'Have you ever had suicidal thoughts ?',
+    'Work Hours', 'Financial Stress', 'Family History of Mental Illness'
+]
+DEPRESSION_NUMERIC_FEATURES = ['Age', 'Work Pressure', 'Job Satisfaction', 'Work Hours', 'Financial Stress']
+
+
+def run_general_model(rows):
+    """Class indices from the in-process general model.
+
+    Uses the reduced-precision weights when configured and loadable, otherwise the traced
+    fast path unless settings.INFERENCE_FAST_PATH is off, in which case it
+    goes through plain Keras predict() for comparison.
+    """
+    global _compiled_general
+    features = np.asarray(rows, dtype=np.float32)
+    if use_quantized_model():
+        return np.argmax(quantized_model(features), axis=1)
+    if settings.INFERENCE_FAST_PATH:
+        if _compiled_general is None:
+            _compiled_general = backends.compiled_indices(load_general_model())
+        return _compiled_general(features)
+    prediction = load_general_model().predict(features, verbose=0)
+    return np.argmax(prediction, axis=1)
+
+
+def run_depression_model(rows):
+    """0/1 predictions from the in-process depression model."""
+    import pandas as pd
+    depression_model, scaler = load_depression_model()
+    input_data = pd.DataFrame(np.asarray(rows, dtype=float), columns=DEPRESSION_FEATURES)
+    input_data[DEPRESSION_NUMERIC_FEATURES] = scaler.transform(input_data[DEPRESSION_NUMERIC_FEATURES])
+    return depression_model.predict(input_data)
+
+
+def predict_labels(rows):
+    """Disorder labels for rows of 28 numeric answers, or None if no model is available."""
+    if label_encoder is None:
+        return None
+    indices = sidecar.predict(sidecar.OP_GENERAL, rows)
+    if indices is None:
+        if not general_model_ready():
+            return None
+        indices = run_general_model(rows)
+    # plain indexing; inverse_transform re-validates the indices on every call
+    labels = label_encoder.classes_[indices]
+    for answers, label in zip(rows, labels):
+        shadow.submit(answers, label)
+    return labels
+
+
+def predict_depression_rows(rows):
+    """0/1 depression predictions for rows of DEPRESSION_FEATURES, or None if no model is available."""
+    predictions = sidecar.predict(sidecar.OP_DEPRESSION, rows)
+    if predictions is None:
+        if load_depression_model()[0] is None:
+            return None
+        predictions = run_depression_model(rows)
+    return predictions
+
 
 def predict_disorder(answers_numeric):
-    if model is None or label_encoder is None:
+    labels = predict_labels([answers_numeric])
+    if labels is None:
         return {
             "predicted_disorder": "Unknown",
             "description": "Model not loaded",
             "suggestions": [],
             "video": ""
         }
-    features = np.array([answers_numeric], dtype=float)
-    prediction = model.predict(features)
-    predicted_disorder = label_encoder.inverse_transform([np.argmax(prediction)])[0]
+    predicted_disorder = labels[0]
     result = INFO.get(predicted_disorder, {"description": "No clear match found.", "suggestions": [], "video": ""})
     return {
         "predicted_disorder": predicted_disorder,
@@ -7,6 +7,7 @@ urlpatterns = [
     path('api/predict/', views.api_predict, name='api_predict'),
     path('api/general-test/submit/', views.submit_general_test),
     path('api/general-test/results/', views.test_results),
-    path('depression/',views.predict_depression, name='depression' )
+    path('depression/',views.predict_depression, name='depression' ),
+    path('health/', views.health, name='health'),
    
 ]
@@ -3,46 +3,15 @@ from django.http import JsonResponse
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 import json
-import os
-import pandas as pd
-import numpy as np
-from tensorflow.keras.models import load_model
-import joblib
+import resource
+from mental_assessment import sidecar
+from mental_assessment.idempotency import idempotent
+from mental_assessment import utils as ml
+from predict_disorder import thread_budget
 from .models import GeneralTestResult
 
-print("🚀 Starting Django app...")
-
-# Load the Keras model
-try:
-    print("🧠 Loading Keras model...")
-    model = load_model(os.path.join('ml_models', 'general_model.h5'))
-    print("✅ Model loaded successfully!")
-except Exception as e:
-    print("❌ Error loading model:", e)
-    model = None
-
-# Load the label encoder
-try:
-    print("🎯 Loading label encoder...")
-    label_encoder = joblib.load(os.path.join('ml_models', 'label_encoder.pkl'))
-    print("✅ Label encoder loaded successfully!")
-except Exception as e:
-    print("⚠️ Could not load label encoder:", e)
-    label_encoder = None
-
-# ---- Depression Model ----
-try:
-    
-    print("🧠 Loading Depression model...")
-    depression_model = joblib.load(os.path.join('ml_models', 'depression_model.pkl'))
-    scaler = joblib.load(os.path.join('ml_models', 'scaler.pkl'))
-    print("✅ Depression model and scaler loaded successfully!")
-except Exception as e:
-    print("❌ Error loading depression model or scaler:", e)
-    depression_model = None
-    scaler = None
-
-print("🔥 Views.py finished loading!")
+# The models are loaded once in mental_assessment.utils (or served by the
+# inference sidecar) and shared by both apps.
 
 # List of features required for prediction
 FEATURES_NAME = [
@@ -61,8 +30,10 @@ def predict(request):
     if request.method == 'POST':
         try:
             features = [int(request.POST.get(feature, 0)) for feature in FEATURES_NAME]
-            prediction = model.predict(np.array([features]))
-            predicted_disorder = label_encoder.inverse_transform([np.argmax(prediction)])[0]
+            labels = ml.predict_labels([features])
+            if labels is None:
+                return render(request, 'predict.html', {"error": "Model or encoder not loaded"})
+            predicted_disorder = labels[0]
             result = f"The predicted mental health condition is: {predicted_disorder}"
             return render(request, 'predict.html', {"result": result})
         except Exception as e:
@@ -97,9 +68,11 @@ def api_predict(request):
             return JsonResponse({"error": f"Invalid feature values (should be 0 or 1): {invalid_features}"}, status=400)
 
         # Make prediction
-        features = np.array([[int(data.get(key)) for key in FEATURES_NAME]])
-        prediction = model.predict(features)
-        predicted_disorder = label_encoder.inverse_transform([np.argmax(prediction)])[0]
+        features = [int(data.get(key)) for key in FEATURES_NAME]
+        labels = ml.predict_labels([features])
+        if labels is None:
+            return JsonResponse({"error": "Model or encoder not loaded"}, status=500)
+        predicted_disorder = labels[0]
 
         return JsonResponse({
             "predicted_disorder": predicted_disorder,
@@ -112,6 +85,7 @@ def api_predict(request):
 # Receive answers and return prediction
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@idempotent
 def submit_general_test(request):
     """Receive answers from Flutter, predict disorder, and return suggestions."""
     try:
@@ -122,9 +96,6 @@ def submit_general_test(request):
         if not answers or len(answers) != 28:
             return JsonResponse({"error": "28 answers are required"}, status=400)
 
-        if model is None or label_encoder is None:
-            return JsonResponse({"error": "Model or encoder not loaded"}, status=500)
-
         # check the age for first question , other questions
         answers_numeric = []
         for i, ans in enumerate(answers):
@@ -139,11 +110,10 @@ def submit_general_test(request):
             else:
                 answers_numeric.append(1 if str(ans).lower() in ["yes", "true", "1"] else 0)
 
-        # change them to numbers
-        features = np.array([answers_numeric], dtype= float)
-
-        prediction = model.predict(features)
-        predicted_disorder = label_encoder.inverse_transform([np.argmax(prediction)])[0]
+        labels = ml.predict_labels([answers_numeric])
+        if labels is None:
+            return JsonResponse({"error": "Model or encoder not loaded"}, status=500)
+        predicted_disorder = labels[0]
 
         info = {
                 "Major Depressive Disorder (MDD)": {
@@ -225,6 +195,8 @@ def submit_general_test(request):
                 answers=answers_numeric
             )
 
+        if ml.wants_compact(request):
+            return JsonResponse(ml.compact_prediction(predicted_disorder))
         return JsonResponse({
             "predicted_disorder": predicted_disorder,
             "description": result["description"],
@@ -298,21 +270,14 @@ def predict_depression(request):
                 'Healthy': 5
             }
             dietary = diet_map.get(dietary, 2.5)
-            # prepare the features for prediction from dataset
-            input_data = pd.DataFrame([[
+            # features in the order of ml.DEPRESSION_FEATURES, as in the dataset
+            predictions = ml.predict_depression_rows([[
                 gender, age, work_pressure, job_satisfaction, sleep_duration,
                 dietary, suicidal, work_hours, financial_stress, family_history
-            ]], columns=[
-                'Gender', 'Age', 'Work Pressure', 'Job Satisfaction', 
-                'Sleep Duration', 'Dietary Habits', 
-                'Have you ever had suicidal thoughts ?', 
-                'Work Hours', 'Financial Stress', 'Family History of Mental Illness'
-            ])
-
-            numeric_cols = ['Age', 'Work Pressure', 'Job Satisfaction', 'Work Hours', 'Financial Stress']
-            input_data [numeric_cols] = scaler.transform(input_data[numeric_cols])
-
-            prediction = depression_model.predict(input_data)[0]
+            ]])
+            if predictions is None:
+                raise RuntimeError("Depression model or scaler not loaded")
+            prediction = predictions[0]
 
             print("🧠 Prediction:", prediction)
             if int(prediction) == 1:
@@ -325,3 +290,26 @@ def predict_depression(request):
     return render(request, 'depression.html', {'result': result})
 
 
+def resident_memory_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (OSError, ValueError, IndexError):
+        # peak rather than current RSS, in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# Health check for the load balancer and for checking the worker's thread budget
+def health(request):
+    return JsonResponse({
+        "status": "ok",
+        "models": {
+            "general": ml.model is not None or ml.quantized_model is not None,
+            "label_encoder": ml.label_encoder is not None,
+            "depression": ml.depression_model is not None and ml.scaler is not None,
+        },
+        "weights": ml.weights_report(),
+        "resident_memory_bytes": resident_memory_bytes(),
+        "sidecar": sidecar.status(),
+        "threads": thread_budget.effective(),
+    })
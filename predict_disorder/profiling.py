@@ -0,0 +1,217 @@
+"""
+Opt-in per-request profiling.
+
+A request is profiled only when it carries the privileged header
+(``PROFILING_HEADER`` set to ``PROFILING_TOKEN``) or wins the
+``PROFILING_SAMPLE_RATE`` draw. Each profile stores the cProfile hot spots
+and a breakdown of the ORM queries the request ran. The last
+``PROFILING_KEEP`` profiles are kept in ``PROFILING_DIR`` and listed under
+``/admin/profiles/`` for staff users.
+
+When ``PROFILING_ENABLED`` is off the middleware removes itself from the
+stack at startup, so requests pay nothing for it.
+
+Only one cProfile can be active per process (Python 3.12+), and it sees
+every thread. On a ``gthread`` worker a request that arrives while another
+is being profiled is served unprofiled, and a profile can include work done
+by other request threads at the same time.
+"""
+import cProfile
+import hmac
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import Http404, JsonResponse
+
+TOP_FUNCTIONS = 40
+TOP_QUERIES = 20
+
+_NUMBERS = re.compile(r"\b\d+\b")
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+
+# held while a request is being profiled in this process
+_profiling = threading.Lock()
+
+
+class RequestProfilerMiddleware:
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.header = 'HTTP_' + settings.PROFILING_HEADER.upper().replace('-', '_')
+        self.token = settings.PROFILING_TOKEN
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+
+    def __call__(self, request):
+        trigger = self._trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+        if not _profiling.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            return self._profile(request, trigger)
+        finally:
+            _profiling.release()
+
+    def _trigger(self, request):
+        if self.token:
+            sent = request.META.get(self.header)
+            # headers arrive as latin-1 text; bytes compare safely whatever was sent
+            if sent and hmac.compare_digest(sent.encode('latin-1', 'replace'), self.token.encode()):
+                return 'header'
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return 'sample'
+        return None
+
+    def _profile(self, request, trigger):
+        queries = []
+
+        def record_query(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries.append((sql, time.perf_counter() - start))
+
+        profiler = cProfile.Profile()
+        started_at = datetime.now(timezone.utc)
+        start = time.perf_counter()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # another profiler (e.g. a debugger's) is already active
+            print("⚠️ Could not start request profiler:", e)
+            return self.get_response(request)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(record_query))
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration = time.perf_counter() - start
+
+        profile_id = f"{started_at:%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+        summary = {
+            "id": profile_id,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "trigger": trigger,
+            "started_at": started_at.isoformat(),
+            "duration_ms": round(duration * 1000, 3),
+            "queries": _query_breakdown(queries),
+            "functions": _top_functions(profiler),
+        }
+        try:
+            _save_profile(profile_id, summary, profiler)
+        except OSError as e:
+            print("⚠️ Could not save request profile:", e)
+        else:
+            response['X-Profile-Id'] = profile_id
+        return response
+
+
+def _query_breakdown(queries):
+    grouped = {}
+    for sql, seconds in queries:
+        shape = _NUMBERS.sub('?', _STRINGS.sub('?', sql))
+        count, total = grouped.get(shape, (0, 0.0))
+        grouped[shape] = (count + 1, total + seconds)
+    top = sorted(grouped.items(), key=lambda item: item[1][1], reverse=True)
+    return {
+        "count": len(queries),
+        "total_ms": round(sum(seconds for _, seconds in queries) * 1000, 3),
+        "top": [
+            {"sql": sql, "count": count, "total_ms": round(total * 1000, 3)}
+            for sql, (count, total) in top[:TOP_QUERIES]
+        ],
+    }
+
+
+def _top_functions(profiler):
+    stats = pstats.Stats(profiler).stats
+    rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)
+    return [
+        {
+            "function": f"{filename}:{line}({name})",
+            "calls": nc,
+            "own_ms": round(tt * 1000, 3),
+            "cumulative_ms": round(ct * 1000, 3),
+        }
+        for (filename, line, name), (cc, nc, tt, ct, callers) in rows[:TOP_FUNCTIONS]
+    ]
+
+
+def _save_profile(profile_id, summary, profiler):
+    directory = settings.PROFILING_DIR
+    os.makedirs(directory, exist_ok=True)
+    profiler.dump_stats(os.path.join(directory, f"{profile_id}.prof"))
+    with open(os.path.join(directory, f"{profile_id}.json"), 'w') as f:
+        json.dump(summary, f)
+
+    # ids start with a timestamp, so name order is age order
+    saved = sorted(name[:-5] for name in os.listdir(directory) if name.endswith('.json'))
+    for old_id in saved[:-settings.PROFILING_KEEP]:
+        for ext in ('.json', '.prof'):
+            try:
+                os.remove(os.path.join(directory, old_id + ext))
+            except FileNotFoundError:
+                pass
+
+
+def _load_profile(profile_id):
+    path = os.path.join(settings.PROFILING_DIR, f"{profile_id}.json")
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+@staff_member_required
+def profile_list(request):
+    try:
+        names = os.listdir(settings.PROFILING_DIR)
+    except FileNotFoundError:
+        names = []
+    ids = sorted((name[:-5] for name in names if name.endswith('.json')), reverse=True)
+
+    profiles = []
+    for profile_id in ids:
+        profile = _load_profile(profile_id)
+        if profile is None:
+            continue
+        profiles.append({
+            "id": profile["id"],
+            "method": profile["method"],
+            "path": profile["path"],
+            "status": profile["status"],
+            "trigger": profile["trigger"],
+            "started_at": profile["started_at"],
+            "duration_ms": profile["duration_ms"],
+            "query_count": profile["queries"]["count"],
+            "query_ms": profile["queries"]["total_ms"],
+        })
+    return JsonResponse({"profiles": profiles})
+
+
+@staff_member_required
+def profile_detail(request, profile_id):
+    profile = _load_profile(profile_id)
+    if profile is None:
+        raise Http404("Profile not found")
+    return JsonResponse(profile)
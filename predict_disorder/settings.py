@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'predict_disorder.profiling.RequestProfilerMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -90,6 +91,30 @@ else:
         }
     }
 
+# ---------------------------------------------------------------------
+# Caches
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Stored responses for Idempotency-Key replays, shared by the workers on this machine
+    'idempotency': {
+        'BACKEND': os.getenv('IDEMPOTENCY_CACHE_BACKEND', 'mental_assessment.idempotency.AtomicFileBasedCache'),
+        'LOCATION': os.getenv('IDEMPOTENCY_CACHE_LOCATION', '/tmp/predict_disorder_idempotency'),
+        'TIMEOUT': int(os.getenv('IDEMPOTENCY_TTL', '86400')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('IDEMPOTENCY_MAX_ENTRIES', '10000')),
+        },
+    },
+    # In-flight Idempotency-Key claims; kept apart so culling stored responses never drops one
+    'idempotency_claims': {
+        'BACKEND': os.getenv('IDEMPOTENCY_CACHE_BACKEND', 'mental_assessment.idempotency.AtomicFileBasedCache'),
+        'LOCATION': os.getenv('IDEMPOTENCY_CLAIMS_LOCATION', '/tmp/predict_disorder_idempotency_claims'),
+    },
+}
+# How long a retry waits for the first request with the same key to finish
+IDEMPOTENCY_WAIT = float(os.getenv('IDEMPOTENCY_WAIT', '10'))
+
 # ---------------------------------------------------------------------
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -126,4 +151,40 @@ REST_FRAMEWORK = {
 MODEL_PATH = os.getenv('MODEL_PATH', 'ml_models/general_model.h5')
 ENCODER_PATH = os.getenv('ENCODER_PATH', 'ml_models/label_encoder.pkl')
 
+# Serve the general model from a float16/int8 copy of its weights written by
+# `python manage.py quantize_general_model` and committed with the .h5, e.g.
+# ml_models/general_model.float16.npz. Falls back to the .h5 if it can't be loaded.
+GENERAL_MODEL_WEIGHTS = os.getenv('GENERAL_MODEL_WEIGHTS', '')
+
+# Run the general model through a traced tf.function instead of Keras
+# predict(); set to false to compare against plain predict().
+INFERENCE_FAST_PATH = os.getenv('INFERENCE_FAST_PATH', 'True').lower() == 'true'
+
+# Optional inference sidecar (`python manage.py run_inference_server`).
+# When set, workers send predictions over this Unix socket instead of loading
+# the models themselves, and fall back to in-process models if it is down.
+INFERENCE_SOCKET = os.getenv('INFERENCE_SOCKET', '')
+INFERENCE_POOL_SIZE = int(os.getenv('INFERENCE_POOL_SIZE', '4'))
+INFERENCE_TIMEOUT = float(os.getenv('INFERENCE_TIMEOUT', '2'))
+INFERENCE_RETRY_AFTER = float(os.getenv('INFERENCE_RETRY_AFTER', '5'))
+
+# Shadow evaluation of a candidate general model (off unless SHADOW_MODEL_PATH is set).
+# Sampled live predictions are re-scored in background threads; the queue
+# drops samples once SHADOW_QUEUE_SIZE are waiting.
+SHADOW_MODEL_PATH = os.getenv('SHADOW_MODEL_PATH', '')
+SHADOW_SAMPLE_RATE = float(os.getenv('SHADOW_SAMPLE_RATE', '0.1'))
+SHADOW_QUEUE_SIZE = int(os.getenv('SHADOW_QUEUE_SIZE', '1000'))
+SHADOW_BATCH_SIZE = int(os.getenv('SHADOW_BATCH_SIZE', '64'))
+SHADOW_WORKERS = int(os.getenv('SHADOW_WORKERS', '1'))
+SHADOW_STATS_DIR = os.getenv('SHADOW_STATS_DIR', str(BASE_DIR / 'shadow_stats'))
+
+# ---------------------------------------------------------------------
+# Request profiling (off unless PROFILING_ENABLED=true)
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False').lower() == 'true'
+PROFILING_HEADER = os.getenv('PROFILING_HEADER', 'X-Profile-Token')
+PROFILING_TOKEN = os.getenv('PROFILING_TOKEN', '')
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_DIR = os.getenv('PROFILING_DIR', str(BASE_DIR / 'profiles'))
+PROFILING_KEEP = max(1, int(os.getenv('PROFILING_KEEP', '50')))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -0,0 +1,134 @@
+"""
+CPU thread budget for TensorFlow, OpenMP and BLAS.
+
+Every gunicorn worker imports TensorFlow and NumPy, and by default each of
+them sizes its thread pools to the whole machine. With several workers that
+oversubscribes the cores. The budget here splits the available CPUs between
+the workers (and between the request threads of a ``gthread`` worker) and
+must be applied before TensorFlow or NumPy are first imported.
+
+Values the operator already exported (``OMP_NUM_THREADS`` etc.) are kept.
+"""
+import math
+import os
+import sys
+
+THREADED_WORKERS = {'gthread'}
+
+BLAS_ENV_VARS = [
+    'OMP_NUM_THREADS',
+    'OPENBLAS_NUM_THREADS',
+    'MKL_NUM_THREADS',
+    'BLIS_NUM_THREADS',
+    'VECLIB_MAXIMUM_THREADS',
+    'NUMEXPR_NUM_THREADS',
+]
+TF_INTRA_ENV = 'TF_NUM_INTRAOP_THREADS'
+TF_INTER_ENV = 'TF_NUM_INTEROP_THREADS'
+
+_applied = None
+
+
+def available_cpus():
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    # cgroup v2 quota, e.g. "200000 100000" for two CPUs or "max 100000"
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()[:2]
+        if quota != 'max':
+            cpus = min(cpus, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
+
+def worker_class_name(worker_class):
+    # accepts "gthread", "sync" or a dotted path like "gunicorn.workers.gthread.ThreadWorker"
+    name = worker_class.rsplit('.', 1)[-1].lower()
+    return {'threadworker': 'gthread', 'syncworker': 'sync'}.get(name, name)
+
+
+def compute_budget(workers, worker_class='sync', threads=1, cpus=None):
+    cpus = cpus or available_cpus()
+    workers = max(1, int(workers))
+    threads = max(1, int(threads))
+    worker_class = worker_class_name(worker_class)
+    if worker_class == 'sync' and threads > 1:
+        # gunicorn itself runs sync workers as gthread when threads > 1
+        worker_class = 'gthread'
+
+    per_worker = max(1, cpus // workers)
+    if worker_class in THREADED_WORKERS and threads > 1:
+        # each request thread runs its own forward pass, so share the worker's
+        # cores between them and let independent requests use inter-op threads
+        intra_op = max(1, per_worker // threads)
+        inter_op = min(threads, per_worker)
+    else:
+        # sync/async workers run one forward pass at a time
+        intra_op = per_worker
+        inter_op = 1
+
+    return {
+        "cpus": cpus,
+        "workers": workers,
+        "worker_class": worker_class,
+        "threads": threads,
+        "intra_op": intra_op,
+        "inter_op": inter_op,
+        "blas": intra_op,
+    }
+
+
+def budget_from_env():
+    return compute_budget(
+        workers=os.getenv('WEB_CONCURRENCY', '1'),
+        worker_class=os.getenv('GUNICORN_WORKER_CLASS', 'sync'),
+        threads=os.getenv('GUNICORN_THREADS', '1'),
+    )
+
+
+def apply(budget):
+    global _applied
+
+    for var in BLAS_ENV_VARS:
+        os.environ.setdefault(var, str(budget["blas"]))
+    os.environ.setdefault(TF_INTRA_ENV, str(budget["intra_op"]))
+    os.environ.setdefault(TF_INTER_ENV, str(budget["inter_op"]))
+
+    # too late for the environment if these were imported already
+    if 'tensorflow' in sys.modules:
+        tf = sys.modules['tensorflow']
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(int(os.environ[TF_INTRA_ENV]))
+            tf.config.threading.set_inter_op_parallelism_threads(int(os.environ[TF_INTER_ENV]))
+        except RuntimeError:
+            print("⚠️ TensorFlow already initialized; thread budget not applied to it")
+    if 'numpy' in sys.modules:
+        try:
+            from threadpoolctl import threadpool_limits
+            threadpool_limits(int(os.environ['OMP_NUM_THREADS']))
+        except ImportError:
+            pass
+
+    _applied = budget
+    return budget
+
+
+def effective():
+    """The budget that was applied and the settings actually in force."""
+    settings = {
+        "budget": _applied,
+        "env": {var: os.environ.get(var) for var in BLAS_ENV_VARS + [TF_INTRA_ENV, TF_INTER_ENV]},
+    }
+    if 'tensorflow' in sys.modules:
+        # 0 means TensorFlow sized the pool itself, from TF_NUM_*_THREADS when set
+        threading = sys.modules['tensorflow'].config.threading
+        settings["tensorflow"] = {
+            "intra_op": threading.get_intra_op_parallelism_threads(),
+            "inter_op": threading.get_inter_op_parallelism_threads(),
+        }
+    return settings
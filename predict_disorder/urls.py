@@ -16,10 +16,15 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path,include
+from mental_assessment.api.views import DisorderCatalogApiView
+from . import profiling
 
 urlpatterns = [
+    path('admin/profiles/', profiling.profile_list, name='profile_list'),
+    path('admin/profiles/<slug:profile_id>/', profiling.profile_detail, name='profile_detail'),
     path('admin/', admin.site.urls),
     path('', include('myapp.urls')),
     path('assessment/', include('mental_assessment.urls')),
     path('api/assessment/', include('mental_assessment.api.urls')),
+    path('api/disorders/', DisorderCatalogApiView.as_view(), name='api_disorders'),
 ]
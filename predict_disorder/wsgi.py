@@ -11,6 +11,11 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
+from predict_disorder import thread_budget
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'predict_disorder.settings')
 
+# must run before the views import TensorFlow and NumPy
+thread_budget.apply(thread_budget.budget_from_env())
+
 application = get_wsgi_application()